@@ -2,6 +2,7 @@ from ae.core import agents
 from ae.core import memory
 from ae.core import skills
 from ae.core.autogen_wrapper import AutogenWrapper
+from ae.core.page_pool import PagePool
 from ae.core.playwright_manager import PlaywrightManager
 from ae.core.post_process_responses import final_reply_callback_user_proxy
 from ae.core.prompts import LLM_PROMPTS
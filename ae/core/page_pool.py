@@ -0,0 +1,98 @@
+import asyncio
+import os
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from playwright.async_api import BrowserContext
+from playwright.async_api import Page
+
+from ae.utils.logger import logger
+
+
+class PagePool:
+    """
+    A bounded pool of pages opened in a single browser context, so that concurrent operations can run on separate pages.
+
+    Attributes:
+        context (BrowserContext): The browser context the pages are opened in.
+        max_size (int): The maximum number of pages that can be acquired at the same time.
+        reuse_pages (bool): Whether released pages are kept open for the next acquire, instead of being closed.
+    """
+
+    def __init__(self, context: BrowserContext, max_size: int | None = None, reuse_pages: bool = True):
+        """
+        Initializes the PagePool for the given browser context.
+
+        Args:
+            context (BrowserContext): The browser context to open pages in.
+            max_size (int, optional): The maximum number of pages in use at the same time. Defaults to the number of CPUs.
+            reuse_pages (bool, optional): Keep released pages open and hand them out again. Defaults to True.
+        """
+        self.context = context
+        self.max_size = max_size or os.cpu_count() or 1
+        self.reuse_pages = reuse_pages
+        self._semaphore = asyncio.Semaphore(self.max_size)
+        self._idle_pages: asyncio.Queue[Page] = asyncio.Queue()
+        self._pages: set[Page] = set()
+        self._in_use: set[Page] = set()
+
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Page]:
+        """
+        Acquires a page from the pool, waiting if max_size pages are already in use. The page is released when the block exits.
+
+        Example:
+            async with page_pool.acquire() as page:
+                await page.goto("https://www.example.com")
+        """
+        async with self._semaphore:
+            page = await self._get_page()
+            self._in_use.add(page)
+            try:
+                yield page
+            finally:
+                self._in_use.discard(page)
+                await self._release_page(page)
+
+
+    def is_in_use(self, page: Page) -> bool:
+        """
+        Checks if the page is currently acquired from this pool. Idle pages of the pool are not in use.
+        """
+        return page in self._in_use
+
+
+    async def close(self):
+        """
+        Closes all the pages opened by the pool.
+        """
+        while not self._idle_pages.empty():
+            self._idle_pages.get_nowait()
+        for page in list(self._pages):
+            if not page.is_closed():
+                await page.close()
+        self._pages.clear()
+
+
+    async def _get_page(self) -> Page:
+        while not self._idle_pages.empty():
+            page = self._idle_pages.get_nowait()
+            if not page.is_closed():
+                return page
+            self._pages.discard(page)
+        logger.debug("No idle page available in the page pool. Opening a new page.")
+        page = await self.context.new_page()
+        self._pages.add(page)
+        return page
+
+
+    async def _release_page(self, page: Page):
+        if page.is_closed():
+            self._pages.discard(page)
+            return
+        if self.reuse_pages:
+            self._idle_pages.put_nowait(page)
+        else:
+            self._pages.discard(page)
+            await page.close()
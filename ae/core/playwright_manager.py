@@ -1,4 +1,5 @@
 import asyncio
+import json
 import os
 import tempfile
 import time
@@ -9,6 +10,7 @@ from playwright.async_api import Page
 from playwright.async_api import Playwright
 
 from ae.core.notification_manager import NotificationManager
+from ae.core.page_pool import PagePool
 from ae.core.ui_manager import UIManager
 from ae.utils.dom_mutation_observer import dom_mutation_change_detected
 from ae.utils.dom_mutation_observer import handle_navigation_for_mutation_observer
@@ -20,6 +22,14 @@ from ae.utils.ui_messagetype import MessageType
 # Enusres that playwright does not wait for font loading when taking screenshots. Reference: https://github.com/microsoft/playwright/issues/28995
 os.environ["PW_TEST_SCREENSHOT_NO_FONTS_READY"] = "1"
 
+def _matches_domains(host: str, domains: tuple[str, ...]) -> bool:
+    """
+    Checks if a cookie domain or host name is one of the given domains or a subdomain of one of them.
+    """
+    host = host.lstrip(".")
+    return any(host == domain or host.endswith(f".{domain}") for domain in domains)
+
+
 class PlaywrightManager:
     """
     A singleton class to manage Playwright instances and browsers.
@@ -37,6 +47,9 @@ class PlaywrightManager:
     __async_initialize_done = False
     _take_screenshots = False
     _screenshots_dir = None
+    _storage_state_paths: dict[str, tuple[str, ...]] = {}
+    _pending_screenshots: list[asyncio.Task[None]] = []
+    _page_pool: PagePool | None = None
 
     def __new__(cls, *args, **kwargs): # type: ignore
         """
@@ -92,6 +105,102 @@ class PlaywrightManager:
         self.__async_initialize_done = True
 
 
+    @classmethod
+    async def get_shared(cls) -> "PlaywrightManager":
+        """
+        Returns the shared PlaywrightManager instance, making sure Playwright is started and the browser context exists.
+        Skills can use this instead of re-instantiating the manager and resolving the context on every call.
+
+        Returns:
+            PlaywrightManager: The singleton instance with a live browser context.
+        """
+        manager = cls(browser_type='chromium', headless=False)
+        if cls._playwright is None or cls._browser_context is None:
+            await manager.start_playwright()
+            await manager.ensure_browser_context()
+        return manager
+
+
+    async def get_page_pool(self) -> PagePool:
+        """
+        Returns the pool of pages for skills that run concurrently, creating it for the current browser context if needed.
+        Pool pages are not returned by get_current_page while they are acquired, so other skills do not navigate them away mid-operation.
+        Once released, they are regular pages again, e.g. the agent can act on an email draft left open in one.
+
+        Returns:
+            PagePool: The page pool of the current browser context.
+        """
+        browser_context: BrowserContext = await self.get_browser_context() # type: ignore
+        if PlaywrightManager._page_pool is None or PlaywrightManager._page_pool.context is not browser_context:
+            PlaywrightManager._page_pool = PagePool(browser_context, reuse_pages=True)
+        return PlaywrightManager._page_pool
+
+
+    @classmethod
+    def register_storage_state(cls, path: str, domains: tuple[str, ...]):
+        """
+        Registers a storage state file to be loaded into every browser context when it is created, if the file exists.
+
+        Args:
+            path (str): The path of the storage state file.
+            domains (tuple[str, ...]): Only cookies of these domains and their subdomains are loaded from the file.
+        """
+        cls._storage_state_paths[path] = domains
+
+
+    async def load_storage_state(self, path: str, domains: tuple[str, ...]):
+        """
+        Loads the cookies of a storage state file (as written by save_storage_state) into the browser context.
+        The browser context is persistent and cannot be created with a storage state, so the cookies are added to it instead.
+        Only cookies the profile does not already have are added, so the saved snapshot never overwrites newer cookies of the profile.
+        Does nothing if the file does not exist.
+
+        Args:
+            path (str): The path of the storage state file.
+            domains (tuple[str, ...]): Only cookies of these domains and their subdomains are loaded.
+        """
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            browser_context: BrowserContext = await self.get_browser_context() # type: ignore
+            existing_cookies = {(cookie["name"], cookie["domain"], cookie["path"]) for cookie in await browser_context.cookies()} # type: ignore
+            cookies = [cookie for cookie in state.get("cookies", [])
+                       if _matches_domains(cookie["domain"], domains) and (cookie["name"], cookie["domain"], cookie["path"]) not in existing_cookies]
+            if cookies:
+                await browser_context.add_cookies(cookies)
+            logger.info(f"Loaded browser storage state from {path}")
+        except Exception as e:
+            logger.error(f"Failed to load browser storage state from {path}: {e}")
+
+
+    async def save_storage_state(self, path: str, domains: tuple[str, ...]):
+        """
+        Saves the cookies of the given domains to a storage state file, readable only by the current user.
+        The browser context uses a persistent profile, so the rest of its cookies are left out rather than copied to the file.
+        Local storage is not saved, since load_storage_state only restores cookies.
+
+        Args:
+            path (str): The path of the storage state file.
+            domains (tuple[str, ...]): Only cookies of these domains and their subdomains are saved.
+        """
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, mode=0o700, exist_ok=True)
+            browser_context: BrowserContext = await self.get_browser_context() # type: ignore
+            cookies = [cookie for cookie in await browser_context.cookies() if _matches_domains(cookie["domain"], domains)] # type: ignore
+            state = {"cookies": cookies, "origins": []}
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                os.fchmod(fd, 0o600)  # The mode of os.open only applies when the file is created
+                json.dump(state, f)
+            logger.info(f"Saved browser storage state to {path}")
+        except Exception as e:
+            logger.error(f"Failed to save browser storage state to {path}: {e}")
+
+
     async def ensure_browser_context(self):
         """
         Ensure that a browser context exists, creating it if necessary.
@@ -121,6 +230,12 @@ class PlaywrightManager:
         """
         Stops the Playwright instance and resets it to None. This method should be called to clean up resources.
         """
+        await self.flush_pending_screenshots()
+
+        if PlaywrightManager._page_pool is not None:
+            await PlaywrightManager._page_pool.close()
+            PlaywrightManager._page_pool = None
+
         # Close the browser context if it's initialized
         if PlaywrightManager._browser_context is not None:
             await PlaywrightManager._browser_context.close()
@@ -164,6 +279,9 @@ class PlaywrightManager:
         else:
             raise ValueError(f"Unsupported browser type: {self.browser_type}")
 
+        for path, domains in PlaywrightManager._storage_state_paths.items():
+            await self.load_storage_state(path, domains)
+
 
     async def get_browser_context(self):
             """
@@ -196,8 +314,9 @@ class PlaywrightManager:
         """
         try:
             browser: BrowserContext = await self.get_browser_context() # type: ignore
-            # Filter out closed pages
-            pages: list[Page] = [page for page in browser.pages if not page.is_closed()]
+            # Filter out closed pages and the pages a skill has currently acquired from the page pool
+            page_pool = PlaywrightManager._page_pool
+            pages: list[Page] = [page for page in browser.pages if not page.is_closed() and (page_pool is None or not page_pool.is_in_use(page))]
             page: Page | None = pages[-1] if pages else None
             logger.debug(f"Current page: {page.url if page else None}")
             if page is not None:
@@ -393,7 +512,8 @@ class PlaywrightManager:
         return self._screenshots_dir
 
     async def take_screenshots(self, name: str, page: Page|None, full_page: bool = True, include_timestamp: bool = True,
-                               load_state: str = 'domcontentloaded', take_snapshot_timeout: int = 5*1000):
+                               load_state: str = 'domcontentloaded', take_snapshot_timeout: int = 5*1000,
+                               image_type: str = 'png', quality: int | None = None):
         if not self._take_screenshots:
             return
         if page is None:
@@ -403,16 +523,46 @@ class PlaywrightManager:
 
         if include_timestamp:
             screenshot_name = f"{int(time.time_ns())}_{screenshot_name}"
-        screenshot_name += ".png"
+        screenshot_name += f".{image_type}"
         screenshot_path = f"{self.get_screenshots_dir()}/{screenshot_name}"
         try:
             await page.wait_for_load_state(state=load_state, timeout=take_snapshot_timeout) # type: ignore
-            await page.screenshot(path=screenshot_path, full_page=full_page, timeout=take_snapshot_timeout, caret="initial", scale="device")
+            await page.screenshot(path=screenshot_path, full_page=full_page, timeout=take_snapshot_timeout, caret="initial", scale="device",
+                                  type=image_type, quality=quality) # type: ignore
             logger.debug(f"Screen shot saved to: {screenshot_path}")
         except Exception as e:
             logger.error(f"Failed to take screenshot and save to \"{screenshot_path}\". Error: {e}")
 
 
+    def take_screenshots_in_background(self, name: str, page: Page|None, **kwargs) -> asyncio.Task[None] | None: # type: ignore
+        """
+        Schedules take_screenshots without waiting for it, so that capturing and saving the screenshot stays off the caller's critical path.
+        Does nothing if screenshots are disabled. Pending screenshots are awaited by flush_pending_screenshots.
+
+        Args:
+            name (str): The name of the screenshot.
+            page (Page|None): The page to take the screenshot of. Defaults to the current page.
+            **kwargs: Additional arguments passed on to take_screenshots.
+
+        Returns:
+            asyncio.Task[None] | None: The scheduled task, which the caller may await later, or None if screenshots are disabled.
+        """
+        if not self._take_screenshots:
+            return None
+        task = asyncio.create_task(self.take_screenshots(name, page, **kwargs)) # type: ignore
+        PlaywrightManager._pending_screenshots.append(task)
+        task.add_done_callback(PlaywrightManager._pending_screenshots.remove)
+        return task
+
+
+    async def flush_pending_screenshots(self):
+        """
+        Waits for all the screenshots scheduled with take_screenshots_in_background to be saved.
+        """
+        if PlaywrightManager._pending_screenshots:
+            await asyncio.gather(*PlaywrightManager._pending_screenshots, return_exceptions=True)
+
+
     def log_user_message(self, message: str):
         """
         Log the user's message.
@@ -1,16 +1,58 @@
-import inspect
+import asyncio
 import os
 from typing import Annotated
-import traceback
 
-from playwright.async_api import Page, TimeoutError as PlaywrightTimeoutError
+from playwright.async_api import Page
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
 from ae.core.playwright_manager import PlaywrightManager
 from ae.core.skills.skill_registry import skill
-from ae.core.skills.enter_text_using_selector import do_entertext
 from ae.utils.logger import logger
 from ae.utils.ui_messagetype import MessageType
 
+# Gmail cookies saved after a successful sign-in and loaded into every new browser context, so that later runs can skip the sign-in flow
+GMAIL_STORAGE_STATE_PATH = os.path.expanduser("~/.ae/gmail_state.json")
+GMAIL_STORAGE_STATE_DOMAINS = ("google.com",)
+PlaywrightManager.register_storage_state(GMAIL_STORAGE_STATE_PATH, GMAIL_STORAGE_STATE_DOMAINS)
+
+# Gmail credentials used when sign-in is required. The .env file is already loaded when ae.utils.logger is imported
+_EMAIL = os.environ.get('EMAIL')
+_PASSWORD = os.environ.get('PASSWORD')
+
+def _require_credentials() -> tuple[str, str]:
+    """
+    Returns the Gmail credentials read at import time, raising a ValueError if any of them is not set.
+    """
+    if not _EMAIL or not _PASSWORD:
+        missing = [name for name, value in (('EMAIL', _EMAIL), ('PASSWORD', _PASSWORD)) if not value]
+        raise ValueError(f"{' or '.join(missing)} environment variables are not set.")
+    return _EMAIL, _PASSWORD
+
+# Fail at import time instead of at the first sign-in when explicitly asked to
+if os.environ.get('AE_VALIDATE_ENV') == '1':
+    _require_credentials()
+
+# CSS selectors for the Gmail and Google sign-in elements, resolved through the DOM instead of the accessibility tree
+_SEL = {
+    'compose': 'div[gh="cm"]',
+    'dialog': 'div[role="dialog"]',
+    'new_msg': 'div[role="dialog"][aria-label^="New Message"]',
+    'compose_window': 'div[role="dialog"]:has(input[name="subjectbox"])',
+    'save_and_close': 'img[aria-label="Save & close"]',
+    'to': 'input[name="to"], input[aria-label="To recipients"]',
+    'subject': 'input[name="subjectbox"]',
+    'body': 'div[aria-label="Message Body"]',
+    'signin': 'a[href*="ServiceLogin"]',
+    'signin_email': 'input[type="email"]',
+    'signin_next': '#identifierNext button',
+    'signin_password': 'input[type="password"]',
+}
+
+# Overall time budget in seconds for navigating to Gmail, signing in and filling in the email
+COMPOSE_EMAIL_TIMEOUT = 60.0
+# Time budget in milliseconds for each individual navigation, wait, click and fill of the flow
+STEP_TIMEOUT = 10000
+
 @skill(description="Compose an email in Gmail without sending it.", name="compose_email_in_gmail")
 async def compose_email(
     recipient: Annotated[str, "The email address of the recipient."],
@@ -22,163 +64,140 @@ async def compose_email(
     """
     logger.info(f"Starting compose_email function with recipient: {recipient}, subject: {subject}")
 
-    browser_manager = PlaywrightManager(browser_type='chromium', headless=False)
-    page = await browser_manager.get_current_page()
-    if page is None:
-        error_message = "Error: No active page found. OpenURL command opens a new page."
-        logger.error(error_message)
-        raise ValueError(error_message)
-
-    function_name = inspect.currentframe().f_code.co_name
-
-    try:
-        await browser_manager.take_screenshots(f"{function_name}_start", page)
-        # Navigate to Gmail if not already there
-        if "mail.google.com" not in page.url:
-            logger.info("Navigating to Gmail...")
-            await page.goto('https://mail.google.com/', wait_until='networkidle')
-            logger.info(f"Current URL after navigation: {page.url}")
-
-        # Check if sign-in is required
-    #      page.get_by_role("button", name="Next").click()
-    # page.get_by_label("Enter your password").click()
-    # page.get_by_label("Enter your password").fill(password)
-    # page.get_by_label("Enter your password").press("Enter")
-    # page.get_by_role("button", name="Compose").click()
-    # page.get_by_label("To recipients").click()
-    # page.get_by_label("To recipients").fill("phil@creativelaunch.io")
-    # page.get_by_role("option", name="phil@creativelaunch.io phil@").click()
-    # page.get_by_placeholder("Subject").click()
-    # page.get_by_placeholder("Subject").fill("AI agents are the future!")
-    # page.get_by_role("textbox", name="Message Body").click()
-    # page.get_by_role("textbox", name="Message Body").fill("I just wanted to pass along that ai agents are the future!")
-       
-        
-        
-        sign_in_button = page.get_by_role("link", name="Sign in")
-        if await sign_in_button.is_visible():
-            logger.info("Sign-in button detected. Attempting to sign in...")
-            email = os.environ.get('EMAIL')
-            password = os.environ.get('PASSWORD')
-            
-            if not email or not password:
-                raise ValueError("EMAIL or PASSWORD environment variables are not set.")
-
-            await sign_in_button.click()
-
-            # Enter email
-            await page.get_by_label("Email or phone").fill(email)
-            await page.get_by_role("button", name="Next").click()
-            
-            # Wait for password field and enter password
-            await page.wait_for_selector('input[type="password"]', state='visible')
-            password_field = page.get_by_label("Enter your password")
-            await password_field.click()
-            await password_field.fill(password)
-            await password_field.press("Enter")
-            
-            # Wait for Gmail to load after sign-in
-            await page.wait_for_url("https://mail.google.com/mail/u/0/", timeout=30000)
-            logger.info("Successfully signed in to Gmail.")
-        else:
-            logger.info("No sign-in required. Proceeding with email composition.")
-
-    
-        # Click on the "Compose" button
-        await page.get_by_role("button", name="Compose").click()
-        
-        # Wait for the compose window to appear
-        # logger.info("Waiting for compose window to appear...")
-        # await page.wait_for_selector('div[aria-label="New Message"]', state='visible', timeout=5000)
-
-        # Use the do_compose_email function for the actual composition
-        # await page.pause()
-        await page.get_by_text("New Message", exact=True).wait_for(state='visible')
-        logger.info("Calling do_compose_email function...")
-        result = await do_compose_email(page, recipient, subject, body)
-
-        if "Error" in result["summary_message"]:
-            raise ValueError(result["detailed_message"])
-
-        success_message = result["summary_message"]
-        logger.info(success_message)
-        await browser_manager.notify_user(success_message, message_type=MessageType.ACTION)
-
-        await browser_manager.take_screenshots(f"{function_name}_end", page)
-
-        return success_message
-
-    except PlaywrightTimeoutError as e:
-        error_message = f"Timeout error: {str(e)}. The page might be loading slowly or the element might not be present."
-        logger.error(error_message)
-        await browser_manager.notify_user(error_message, message_type=MessageType.ERROR)
-        raise ValueError(error_message) from e
-
-    except Exception as e:
-        error_message = f"Failed to compose email. Error: {str(e)}\n{traceback.format_exc()}"
-        logger.error(error_message)
-        await browser_manager.notify_user(error_message, message_type=MessageType.ERROR)
-        raise ValueError(error_message) from e
-
-async def do_compose_email(page: Page, recipient: str, subject: str, body: str):
+    browser_manager = await PlaywrightManager.get_shared()
+    page_pool = await browser_manager.get_page_pool()
+
+    function_name = "compose_email"
+    screenshot_tasks: list[asyncio.Task[None]] = []
+
+    # Each concurrent call composes on its own page; released pages stay on Gmail for the next call
+    async with page_pool.acquire() as page:
+        try:
+            # The start screenshot records the tab the agent was on: with no page given it uses the current page, which excludes
+            # the acquired pool page about to navigate. It runs concurrently with the compose flow and is awaited in the epilogue
+            start_screenshot_task = browser_manager.take_screenshots_in_background(f"{function_name}_start", None, full_page=False, image_type='jpeg', quality=50)
+            if start_screenshot_task is not None:
+                screenshot_tasks.append(start_screenshot_task)
+            try:
+                await asyncio.wait_for(_compose_email_flow(browser_manager, page, recipient, subject, body), timeout=COMPOSE_EMAIL_TIMEOUT)
+            except asyncio.TimeoutError as e:
+                raise PlaywrightTimeoutError(f"Composing the email did not complete within {COMPOSE_EMAIL_TIMEOUT} seconds.") from e
+
+            success_message = f"Email composed successfully for {recipient}."
+            logger.info(success_message)
+            await asyncio.gather(
+                browser_manager.notify_user(success_message, message_type=MessageType.ACTION),
+                browser_manager.take_screenshots(f"{function_name}_end", page, full_page=False, image_type='jpeg', quality=50),
+                *screenshot_tasks,
+            )
+
+            return success_message
+
+        except PlaywrightTimeoutError as e:
+            error_message = f"Timeout error: {str(e)}. The page might be loading slowly or the element might not be present."
+            logger.error(error_message)
+            await asyncio.gather(browser_manager.notify_user(error_message, message_type=MessageType.ERROR), *screenshot_tasks)
+            raise ValueError(error_message) from e
+
+        except Exception as e:
+            logger.exception("Failed to compose email")
+            error_message = f"Failed to compose email. Error: {e}"
+            await asyncio.gather(browser_manager.notify_user(error_message, message_type=MessageType.ERROR), *screenshot_tasks)
+            raise ValueError(error_message) from e
+
+
+async def _compose_email_flow(browser_manager: PlaywrightManager, page: Page, recipient: str, subject: str, body: str):
     """
-    Performs the email composition operation on the Gmail page.
-
-    This function composes an email on the Gmail page by filling in the recipient,
-    subject, and body fields.
-
-    Args:
-        page (Page): The Playwright Page object representing the browser tab with Gmail open.
-        recipient (str): The email address of the recipient.
-        subject (str): The subject of the email.
-        body (str): The body content of the email.
-
-    Returns:
-        dict[str, str]: Explanation of the outcome of this operation represented as a dictionary 
-                        with 'summary_message' and 'detailed_message'.
-
-    Example:
-        result = await do_compose_email(page, 'example@example.com', 'Test Subject', 'This is a test email.')
-
-    Note:
-        - This function assumes that the Gmail compose window is already open.
-        - It uses Playwright's locator functions to interact with elements.
+    Opens Gmail on the given page, signs in if required, and fills in a new email without sending it.
+    Each step has its own short timeout, while compose_email bounds the whole flow with COMPOSE_EMAIL_TIMEOUT.
     """
-    try:
-        # Debug: Log the start of the function
-        logger.debug(f"Starting do_compose_email with recipient: {recipient}, subject: {subject}")
-
-        # Fill in recipient
-        # logger.debug("Attempting to fill recipient")
-        # Type in recipient directly as field is already focused
-        # await page.keyboard.type(recipient)
-        # logger.debug(f"Typed recipient: {recipient}")
-        
-        # Wait for and click the matching recipient suggestion
-        # await page.get_by_role("option", name=recipient).click()
-        # logger.debug("Selected recipient from suggestion")
-        # Fill in recipient
-        logger.debug("Attempting to fill recipient")
-        await page.keyboard.type(recipient)
-        await page.keyboard.press("Tab")
-        logger.debug("Recipient filled and confirmed")
-
-        # Fill in subject
-        logger.debug("Attempting to fill subject")
-        await page.keyboard.type(subject)
-        await page.keyboard.press("Tab")
-        logger.debug("Subject filled successfully")
-
-        # Fill in email body
-        logger.debug("Attempting to fill email body")
-        await page.keyboard.type(body)
-        logger.debug("Email body filled successfully")
-
-        success_msg = f"Email composed successfully for {recipient}."
-        logger.info(success_msg)
-        return {"summary_message": success_msg, "detailed_message": f"{success_msg} Subject: '{subject}', Body: '{body[:50]}...'"}
-
-    except Exception as e:
-        error = f"Error composing email for {recipient}."
-        logger.error(f"{error} Error details: {str(e)}")
-        return {"summary_message": error, "detailed_message": f"{error} Error: {e}"}
\ No newline at end of file
+    # Navigate to Gmail if not already there. A pooled page left on a sign-in page by a failed call starts over from Gmail
+    if not page.url.startswith("https://mail.google.com/"):
+        logger.info("Navigating to Gmail...")
+        await page.goto('https://mail.google.com/', wait_until='domcontentloaded', timeout=STEP_TIMEOUT)
+        logger.info(f"Current URL after navigation: {page.url}")
+
+    sign_in_button = page.locator(_SEL['signin']).first
+    compose_button = page.locator(_SEL['compose'])
+    sign_in_required = False
+    # When the compose button is already there we are signed in, so skip waiting for the sign-in link
+    if await compose_button.count() == 0:
+        # Wait only for whichever of the sign-in link or the compose button shows up first
+        sign_in_task = asyncio.create_task(sign_in_button.wait_for(state='visible', timeout=STEP_TIMEOUT))
+        compose_task = asyncio.create_task(compose_button.wait_for(state='visible', timeout=STEP_TIMEOUT))
+        pending: set[asyncio.Task[None]] = {sign_in_task, compose_task}
+        finished: asyncio.Task[None] | None = None
+        try:
+            # A waiter that fails does not settle the race, keep waiting on the other one until one of them succeeds
+            while pending and finished is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                finished = next((task for task in done if task.exception() is None), None)
+        finally:
+            # Also runs when the whole flow is cancelled by COMPOSE_EMAIL_TIMEOUT, so no waiter is left behind
+            for task in (sign_in_task, compose_task):
+                task.cancel()
+            await asyncio.gather(sign_in_task, compose_task, return_exceptions=True)
+        if finished is None:
+            raise sign_in_task.exception() or compose_task.exception() # type: ignore
+        sign_in_required = finished is sign_in_task
+
+    # Check if sign-in is required
+    if sign_in_required:
+        logger.info("Sign-in button detected. Attempting to sign in...")
+        # Validate the credentials before the sign-in click navigates away from Gmail
+        email, password = _require_credentials()
+        await sign_in_button.click(timeout=STEP_TIMEOUT)
+
+        # Enter email
+        await page.locator(_SEL['signin_email']).fill(email, timeout=STEP_TIMEOUT)
+        await page.locator(_SEL['signin_next']).click(timeout=STEP_TIMEOUT)
+
+        # Wait for password field and enter password
+        password_field = page.locator(_SEL['signin_password'])
+        await password_field.wait_for(state='visible', timeout=STEP_TIMEOUT)
+        await password_field.click(timeout=STEP_TIMEOUT)
+        await password_field.fill(password, timeout=STEP_TIMEOUT)
+        await password_field.press("Enter", timeout=STEP_TIMEOUT)
+
+        # Wait for Gmail to load after sign-in. Only the compose button matters, whichever /mail/u/N/ URL Gmail lands on
+        await compose_button.wait_for(state='visible', timeout=STEP_TIMEOUT)
+        logger.info("Successfully signed in to Gmail.")
+        await browser_manager.save_storage_state(GMAIL_STORAGE_STATE_PATH, GMAIL_STORAGE_STATE_DOMAINS)
+    else:
+        logger.info("No sign-in required. Proceeding with email composition.")
+
+
+    # The draft composed by an earlier call on this pooled page is left open for the agent to act on. Save and close it
+    # (Gmail keeps it in Drafts) so that compose windows do not pile up and the new one is the only compose window
+    compose_windows = page.locator(_SEL['compose_window'])
+    open_windows = await compose_windows.count()
+    if open_windows > 0:
+        logger.debug(f"Saving and closing {open_windows} compose window(s) left open on the page.")
+        close_buttons = compose_windows.locator(_SEL['save_and_close'])
+        # Close from the last one so the index of the remaining windows does not shift
+        for index in reversed(range(await close_buttons.count())):
+            await close_buttons.nth(index).click(timeout=STEP_TIMEOUT)
+        await compose_windows.first.wait_for(state='detached', timeout=STEP_TIMEOUT)
+
+    # Click on the "Compose" button
+    await compose_button.click(timeout=STEP_TIMEOUT)
+
+    # Wait for the compose window to appear. The aria-label of the dialog may be localized, so also accept the dialog with the
+    # New Message title, within the same wait
+    compose_dialog = page.locator(_SEL['new_msg']).or_(page.locator(_SEL['dialog']).filter(has=page.get_by_text("New Message", exact=True)))
+    await compose_dialog.wait_for(state='visible', timeout=STEP_TIMEOUT)
+
+    # Fill in recipient
+    logger.debug("Attempting to fill recipient")
+    await compose_dialog.locator(_SEL['to']).first.fill(recipient, timeout=STEP_TIMEOUT)
+    logger.debug("Recipient filled successfully")
+
+    # Fill in subject
+    logger.debug("Attempting to fill subject")
+    await compose_dialog.locator(_SEL['subject']).first.fill(subject, timeout=STEP_TIMEOUT)
+    logger.debug("Subject filled successfully")
+
+    # Fill in email body, fill() sets the text of the contenteditable body in one call
+    logger.debug("Attempting to fill email body")
+    await compose_dialog.locator(_SEL['body']).first.fill(body, timeout=STEP_TIMEOUT)
+    logger.debug("Email body filled successfully")